@@ -1,6 +1,8 @@
 package main
 
 import (
+	"bytes"
+	"crypto/subtle"
 	"crypto/tls"
 	"crypto/x509"
 	"encoding/base64"
@@ -8,6 +10,8 @@ import (
 	"fmt"
 	"log"
 	"net/http"
+	"net/url"
+	"strconv"
 	"strings"
 	"time"
 
@@ -107,32 +111,121 @@ const (
 	redirectURI           = "http://localhost:8081/callback"
 )
 
-// sendJSONResponse sends a JSON response with CORS headers
-func sendJSONResponse(w http.ResponseWriter, r *http.Request, data interface{}, statusCode int) {
-	w.Header().Set("Content-Type", "application/json")
-	origin := r.Header.Get("Origin")
+// Serialized OAuth2 error responses
+var (
+	errMethodNotAllowed     = []byte(`{"error":"method_not_allowed"}`)
+	errInvalidRequest       = []byte(`{"error":"invalid_request"}`)
+	errInvalidClient        = []byte(`{"error":"invalid_client"}`)
+	errUnsupportedGrantType = []byte(`{"error":"unsupported_grant_type"}`)
+)
+
+var (
+	hardcodedClientIDBytes     = []byte(hardcodedClientID)
+	hardcodedClientSecretBytes = []byte(hardcodedClientSecret)
+	// hardcodedBasicAuth is the Authorization header sent by the hardcoded client
+	hardcodedBasicAuth = []byte("Basic " + base64.StdEncoding.EncodeToString([]byte(hardcodedClientID+":"+hardcodedClientSecret)))
+)
+
+// constantTimeEqual reports whether got equals want without short-circuiting
+// on the first differing byte
+func constantTimeEqual(got string, want []byte) bool {
+	return subtle.ConstantTimeCompare([]byte(got), want) == 1
+}
+
+// tokenResponse is returned for both the authorization_code and refresh_token
+// grants. The access token is the pre-signed orgOneJwt, so refreshes never
+// re-sign and always hand back the same token. It is serialized once since
+// nothing in it varies per request.
+var tokenResponse = mustMarshal(map[string]interface{}{
+	"access_token":  string(orgOneJwt),
+	"refresh_token": hardcodedRefreshToken,
+	"token_type":    "bearer",
+	"expires_in":    3600,
+})
+
+// mustMarshal serializes a response built from fixed values, panicking on
+// failure since that can only be a programming error
+func mustMarshal(data interface{}) []byte {
+	payload, err := json.Marshal(data)
+	if err != nil {
+		log.Panic(err)
+	}
+	return payload
+}
+
+// corsRequest returns the Origin and Access-Control-Request-Headers values of
+// r, substituting "*" for a missing origin and defaultHeaders for missing
+// request headers
+func corsRequest(r *http.Request, defaultHeaders string) (origin, requestHeaders string) {
+	origin = r.Header.Get("Origin")
 	if origin == "" {
 		origin = "*"
 	}
-	w.Header().Set("Access-Control-Allow-Origin", origin)
-	w.Header().Set("Vary", "Origin")
-	w.Header().Set("Access-Control-Allow-Credentials", "true")
-	requestHeaders := r.Header.Get("Access-Control-Request-Headers")
+	requestHeaders = r.Header.Get("Access-Control-Request-Headers")
 	if requestHeaders == "" {
-		requestHeaders = "content-type, authorization"
+		requestHeaders = defaultHeaders
 	}
-	w.Header().Set("Access-Control-Allow-Headers", requestHeaders)
+	return origin, requestHeaders
+}
+
+// writeCORS sets the CORS response headers shared by every endpoint
+func writeCORS(h http.Header, origin, requestHeaders string) {
+	h.Set("Access-Control-Allow-Origin", origin)
+	h.Set("Vary", "Origin")
+	h.Set("Access-Control-Allow-Credentials", "true")
+	h.Set("Access-Control-Allow-Headers", requestHeaders)
+}
+
+// jsonAllowHeaders is the Access-Control-Allow-Headers value sent with JSON
+// responses when the request does not ask for specific headers
+const jsonAllowHeaders = "content-type, authorization"
+
+// sendRawJSON sends an already serialized JSON payload with CORS headers. The
+// explicit Content-Length lets the connection be reused for the next request.
+func sendRawJSON(w http.ResponseWriter, r *http.Request, payload []byte, statusCode int) {
+	origin, requestHeaders := corsRequest(r, jsonAllowHeaders)
+	h := w.Header()
+	h.Set("Content-Type", "application/json")
+	writeCORS(h, origin, requestHeaders)
+	h.Set("Content-Length", strconv.Itoa(len(payload)))
 	w.WriteHeader(statusCode)
-	json.NewEncoder(w).Encode(data)
+	w.Write(payload)
 }
 
 // handleRegister handles OAuth2 client registration
 func handleRegister(w http.ResponseWriter, r *http.Request) {
 	if r.Method != http.MethodPost {
-		sendJSONResponse(w, r, map[string]string{"error": "method_not_allowed"}, http.StatusMethodNotAllowed)
+		sendRawJSON(w, r, errMethodNotAllowed, http.StatusMethodNotAllowed)
 		return
 	}
 
+	// RFC 3339 timestamps never need JSON escaping, so they are spliced into the
+	// template verbatim
+	now := time.Now().UTC().AppendFormat(nil, time.RFC3339Nano)
+	payload := make([]byte, 0, registrationTemplateLen+(len(registrationTemplate)-1)*len(now))
+	for i, part := range registrationTemplate {
+		if i > 0 {
+			payload = append(payload, now...)
+		}
+		payload = append(payload, part...)
+	}
+	sendRawJSON(w, r, payload, http.StatusOK)
+}
+
+// registrationTimestamp marks where the created_at and updated_at values go in
+// registrationTemplate
+const registrationTimestamp = "__TS__"
+
+var (
+	// registrationTemplate is the serialized registration response split around
+	// its timestamp values, which are the only fields that vary per request
+	registrationTemplate    = buildRegistrationTemplate()
+	registrationTemplateLen = len(bytes.Join(registrationTemplate, nil))
+)
+
+// buildRegistrationTemplate serializes the registration response with
+// placeholder timestamps and splits it around them
+func buildRegistrationTemplate() [][]byte {
 	registration := map[string]interface{}{
 		"client_id":                  hardcodedClientID,
 		"client_secret":              hardcodedClientSecret,
@@ -142,41 +235,86 @@ func handleRegister(w http.ResponseWriter, r *http.Request) {
 		"grant_types":                []string{"authorization_code", "refresh_token"},
 		"response_types":             []string{"code"},
 		"token_endpoint_auth_method": "client_secret_basic",
-		"created_at":                 time.Now().Format(time.RFC3339Nano),
-		"updated_at":                 time.Now().Format(time.RFC3339Nano),
+		"created_at":                 registrationTimestamp,
+		"updated_at":                 registrationTimestamp,
 	}
-	sendJSONResponse(w, r, registration, http.StatusOK)
+	return bytes.Split(mustMarshal(registration), []byte(registrationTimestamp))
 }
 
 // handleAuthorize handles OAuth2 authorization endpoint
 func handleAuthorize(w http.ResponseWriter, r *http.Request) {
 	if r.Method != http.MethodGet {
-		sendJSONResponse(w, r, map[string]string{"error": "method_not_allowed"}, http.StatusMethodNotAllowed)
+		sendRawJSON(w, r, errMethodNotAllowed, http.StatusMethodNotAllowed)
 		return
 	}
 
-	query := r.URL.Query()
-	clientID := query.Get("client_id")
-	redirectURI := query.Get("redirect_uri")
+	clientID, requestedRedirectURI := authorizeParams(r.URL.RawQuery)
 
-	if clientID != hardcodedClientID {
-		sendJSONResponse(w, r, map[string]string{"error": "invalid_client"}, http.StatusBadRequest)
+	if !constantTimeEqual(clientID, hardcodedClientIDBytes) {
+		sendRawJSON(w, r, errInvalidClient, http.StatusBadRequest)
 		return
 	}
 
+	if requestedRedirectURI == redirectURI {
+		sendRawJSON(w, r, defaultAuthorizeResponse, http.StatusOK)
+		return
+	}
+	sendRawJSON(w, r, buildAuthorizeResponse(requestedRedirectURI), http.StatusOK)
+}
+
+// authorizeParams returns the first client_id and redirect_uri values in
+// rawQuery, as url.ParseQuery followed by Get would. Only these two parameters
+// matter, so the query is scanned directly instead of being decoded into a
+// url.Values map.
+func authorizeParams(rawQuery string) (clientID, redirectURI string) {
+	var haveClientID, haveRedirectURI bool
+	for rawQuery != "" && !(haveClientID && haveRedirectURI) {
+		var pair string
+		pair, rawQuery, _ = strings.Cut(rawQuery, "&")
+		// url.ParseQuery skips empty pairs and rejects pairs containing ';'
+		if pair == "" || strings.Contains(pair, ";") {
+			continue
+		}
+		rawKey, value, _ := strings.Cut(pair, "=")
+		key, err := url.QueryUnescape(rawKey)
+		if err != nil {
+			continue
+		}
+		switch {
+		case key == "client_id" && !haveClientID:
+			if v, err := url.QueryUnescape(value); err == nil {
+				clientID, haveClientID = v, true
+			}
+		case key == "redirect_uri" && !haveRedirectURI:
+			if v, err := url.QueryUnescape(value); err == nil {
+				redirectURI, haveRedirectURI = v, true
+			}
+		}
+	}
+	return clientID, redirectURI
+}
+
+// defaultAuthorizeResponse is the serialized authorize response for the
+// configured redirect URI; responses for any other redirect_uri are built per
+// request
+var defaultAuthorizeResponse = buildAuthorizeResponse(redirectURI)
+
+// buildAuthorizeResponse serializes the redirect pointing redirectURI at the
+// hardcoded authorization code
+func buildAuthorizeResponse(redirectURI string) []byte {
 	callbackURL := fmt.Sprintf("%s?code=%s", redirectURI, hardcodedCode)
-	sendJSONResponse(w, r, map[string]string{"redirect_to": callbackURL}, http.StatusOK)
+	return mustMarshal(map[string]string{"redirect_to": callbackURL})
 }
 
 // handleToken handles OAuth2 token endpoint
 func handleToken(w http.ResponseWriter, r *http.Request) {
 	if r.Method != http.MethodPost {
-		sendJSONResponse(w, r, map[string]string{"error": "method_not_allowed"}, http.StatusMethodNotAllowed)
+		sendRawJSON(w, r, errMethodNotAllowed, http.StatusMethodNotAllowed)
 		return
 	}
 
 	if err := r.ParseForm(); err != nil {
-		sendJSONResponse(w, r, map[string]string{"error": "invalid_request"}, http.StatusBadRequest)
+		sendRawJSON(w, r, errInvalidRequest, http.StatusBadRequest)
 		return
 	}
 
@@ -184,16 +322,13 @@ func handleToken(w http.ResponseWriter, r *http.Request) {
 	clientID := r.FormValue("client_id")
 	clientSecret := r.FormValue("client_secret")
 
-	// Extract Basic auth header if client_id not in body
-	authHeader := r.Header.Get("Authorization")
-	if clientID == "" && strings.HasPrefix(authHeader, "Basic ") {
-		decoded, err := base64.StdEncoding.DecodeString(strings.TrimPrefix(authHeader, "Basic "))
-		if err == nil {
-			parts := strings.SplitN(string(decoded), ":", 2)
-			if len(parts) == 2 {
-				clientID = parts[0]
-				clientSecret = parts[1]
-			}
+	// Extract Basic auth header if client_id not in body. The expected header is
+	// precomputed so the common case skips decoding entirely.
+	if clientID == "" {
+		if constantTimeEqual(r.Header.Get("Authorization"), hardcodedBasicAuth) {
+			clientID, clientSecret = hardcodedClientID, hardcodedClientSecret
+		} else if id, secret, ok := r.BasicAuth(); ok {
+			clientID, clientSecret = id, secret
 		}
 	}
 
@@ -202,57 +337,47 @@ func handleToken(w http.ResponseWriter, r *http.Request) {
 		// Be lenient for generic MCP inspectors/SPAs using PKCE:
 		// - Do not require client_secret (public client)
 		// - Accept any code/redirect_uri/code_verifier
-		response := map[string]interface{}{
-			"access_token":  string(orgOneJwt),
-			"refresh_token": hardcodedRefreshToken,
-			"token_type":    "bearer",
-			"expires_in":    3600,
-		}
-		sendJSONResponse(w, r, response, http.StatusOK)
+		sendRawJSON(w, r, tokenResponse, http.StatusOK)
 
 	case "refresh_token":
 		// For refresh token, still require confidential client auth
-		if clientID != hardcodedClientID || clientSecret != hardcodedClientSecret {
-			sendJSONResponse(w, r, map[string]string{"error": "invalid_client"}, http.StatusBadRequest)
+		// Evaluate both comparisons so timing does not reveal which one failed
+		validID := constantTimeEqual(clientID, hardcodedClientIDBytes)
+		validSecret := constantTimeEqual(clientSecret, hardcodedClientSecretBytes)
+		if !validID || !validSecret {
+			sendRawJSON(w, r, errInvalidClient, http.StatusBadRequest)
 			return
 		}
 		// Accept any refresh_token for testing purposes
-		response := map[string]interface{}{
-			"access_token":  string(orgOneJwt),
-			"refresh_token": hardcodedRefreshToken,
-			"token_type":    "bearer",
-			"expires_in":    3600,
-		}
-		sendJSONResponse(w, r, response, http.StatusOK)
+		sendRawJSON(w, r, tokenResponse, http.StatusOK)
 
 	default:
-		sendJSONResponse(w, r, map[string]string{"error": "unsupported_grant_type"}, http.StatusBadRequest)
+		sendRawJSON(w, r, errUnsupportedGrantType, http.StatusBadRequest)
 	}
 }
 
 // handleJWKS handles JWKS endpoint using orgOneJwks
 func handleJWKS(w http.ResponseWriter, r *http.Request) {
 	if r.Method != http.MethodGet {
-		sendJSONResponse(w, r, map[string]string{"error": "method_not_allowed"}, http.StatusMethodNotAllowed)
+		sendRawJSON(w, r, errMethodNotAllowed, http.StatusMethodNotAllowed)
 		return
 	}
-	// Set CORS headers
-	origin := r.Header.Get("Origin")
-	if origin == "" {
-		origin = "*"
-	}
-	w.Header().Set("Access-Control-Allow-Origin", origin)
-	w.Header().Set("Vary", "Origin")
-	w.Header().Set("Access-Control-Allow-Credentials", "true")
-	w.Header().Set("Content-Type", "application/json")
-	w.WriteHeader(http.StatusOK)
-	w.Write(orgOneJwks)
+	sendRawJSON(w, r, orgOneJwks, http.StatusOK)
 }
 
+// defaultDiscoveryHost is the host the server listens on, and the one assumed
+// when a request carries no Host
+const defaultDiscoveryHost = "localhost:8443"
+
+// defaultDiscovery is the serialized discovery document for requests made over
+// TLS to defaultDiscoveryHost; documents for any other host are built per
+// request
+var defaultDiscovery = buildDiscovery("https://" + defaultDiscoveryHost)
+
 // handleDiscovery handles OAuth2 discovery endpoint
 func handleDiscovery(w http.ResponseWriter, r *http.Request) {
 	if r.Method != http.MethodGet {
-		sendJSONResponse(w, r, map[string]string{"error": "method_not_allowed"}, http.StatusMethodNotAllowed)
+		sendRawJSON(w, r, errMethodNotAllowed, http.StatusMethodNotAllowed)
 		return
 	}
 
@@ -263,10 +388,18 @@ func handleDiscovery(w http.ResponseWriter, r *http.Request) {
 	}
 	host := r.Host
 	if host == "" {
-		host = "localhost:8443"
+		host = defaultDiscoveryHost
+	}
+	if scheme == "https" && host == defaultDiscoveryHost {
+		sendRawJSON(w, r, defaultDiscovery, http.StatusOK)
+		return
 	}
 	baseURL := fmt.Sprintf("%s://%s", scheme, host)
+	sendRawJSON(w, r, buildDiscovery(baseURL), http.StatusOK)
+}
 
+// buildDiscovery serializes the OAuth2 discovery document for baseURL
+func buildDiscovery(baseURL string) []byte {
 	discovery := map[string]interface{}{
 		"issuer":                                "https://kgateway.dev",
 		"authorization_endpoint":                fmt.Sprintf("%s/authorize", baseURL),
@@ -278,25 +411,23 @@ func handleDiscovery(w http.ResponseWriter, r *http.Request) {
 		"token_endpoint_auth_methods_supported": []string{"none", "client_secret_basic", "client_secret_post"},
 		"code_challenge_methods_supported":      []string{"S256"},
 	}
-	sendJSONResponse(w, r, discovery, http.StatusOK)
+	return mustMarshal(discovery)
 }
 
+// preflightAllowHeaders is the Access-Control-Allow-Headers value sent with
+// preflight responses when the request does not ask for specific headers
+const preflightAllowHeaders = "content-type"
+
+// preflightAllowMethods is the Access-Control-Allow-Methods value sent with
+// every preflight response
+const preflightAllowMethods = "GET, POST, OPTIONS"
+
 // handleOPTIONS handles CORS preflight requests
 func handleOPTIONS(w http.ResponseWriter, r *http.Request) {
-	origin := r.Header.Get("Origin")
-	if origin == "" {
-		origin = "*"
-	}
-	requestHeaders := r.Header.Get("Access-Control-Request-Headers")
-	if requestHeaders == "" {
-		requestHeaders = "content-type"
-	}
-
-	w.Header().Set("Access-Control-Allow-Origin", origin)
-	w.Header().Set("Vary", "Origin")
-	w.Header().Set("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
-	w.Header().Set("Access-Control-Allow-Headers", requestHeaders)
-	w.Header().Set("Access-Control-Allow-Credentials", "true")
+	origin, requestHeaders := corsRequest(r, preflightAllowHeaders)
+	h := w.Header()
+	writeCORS(h, origin, requestHeaders)
+	h.Set("Access-Control-Allow-Methods", preflightAllowMethods)
 	w.WriteHeader(http.StatusNoContent)
 }
 
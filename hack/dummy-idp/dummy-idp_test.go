@@ -0,0 +1,93 @@
+package main
+
+import (
+	"net/url"
+	"testing"
+)
+
+func TestAuthorizeParams(t *testing.T) {
+	tests := []struct {
+		name            string
+		rawQuery        string
+		wantClientID    string
+		wantRedirectURI string
+	}{
+		{
+			name:            "empty query",
+			rawQuery:        "",
+			wantClientID:    "",
+			wantRedirectURI: "",
+		},
+		{
+			name:            "escaped values",
+			rawQuery:        "client_id=abc&redirect_uri=http%3A%2F%2Flocalhost%3A8081%2Fcallback",
+			wantClientID:    "abc",
+			wantRedirectURI: "http://localhost:8081/callback",
+		},
+		{
+			name:            "plus decodes to space",
+			rawQuery:        "redirect_uri=a+b",
+			wantClientID:    "",
+			wantRedirectURI: "a b",
+		},
+		{
+			name:            "escaped keys",
+			rawQuery:        "client%5Fid=abc&redirect%5furi=http://localhost:8081/callback",
+			wantClientID:    "abc",
+			wantRedirectURI: "http://localhost:8081/callback",
+		},
+		{
+			name:            "duplicate keys keep the first value",
+			rawQuery:        "client_id=first&redirect_uri=one&client_id=second&redirect_uri=two",
+			wantClientID:    "first",
+			wantRedirectURI: "one",
+		},
+		{
+			name:            "missing equals sign yields an empty value",
+			rawQuery:        "client_id&redirect_uri=one&client_id=second",
+			wantClientID:    "",
+			wantRedirectURI: "one",
+		},
+		{
+			name:            "bad value escape is skipped",
+			rawQuery:        "client_id=%zz&client_id=abc",
+			wantClientID:    "abc",
+			wantRedirectURI: "",
+		},
+		{
+			name:            "bad key escape is skipped",
+			rawQuery:        "client%zzid=bad&client_id=abc",
+			wantClientID:    "abc",
+			wantRedirectURI: "",
+		},
+		{
+			name:            "pair with semicolon is skipped",
+			rawQuery:        "client_id=a;b&client_id=abc",
+			wantClientID:    "abc",
+			wantRedirectURI: "",
+		},
+		{
+			name:            "empty pairs are skipped",
+			rawQuery:        "&&client_id=abc&",
+			wantClientID:    "abc",
+			wantRedirectURI: "",
+		},
+	}
+
+	for _, tt := range tests {
+		t.Run(tt.name, func(t *testing.T) {
+			clientID, redirectURI := authorizeParams(tt.rawQuery)
+			if clientID != tt.wantClientID || redirectURI != tt.wantRedirectURI {
+				t.Errorf("authorizeParams(%q) = (%q, %q), want (%q, %q)",
+					tt.rawQuery, clientID, redirectURI, tt.wantClientID, tt.wantRedirectURI)
+			}
+
+			// authorizeParams replaces url.Values lookups, so it must agree with them
+			query, _ := url.ParseQuery(tt.rawQuery)
+			if clientID != query.Get("client_id") || redirectURI != query.Get("redirect_uri") {
+				t.Errorf("authorizeParams(%q) = (%q, %q), url.ParseQuery gives (%q, %q)",
+					tt.rawQuery, clientID, redirectURI, query.Get("client_id"), query.Get("redirect_uri"))
+			}
+		})
+	}
+}